@@ -5,8 +5,30 @@ import numpy as np
 from PIL import Image
 import os
 import sys
+import platform
 import base64
 import threading
+import queue
+
+# Try to import MediaPipe (preferred face/eye detector)
+try:
+    import mediapipe as mp
+    MEDIAPIPE_ENABLED = True
+except ImportError:
+    print("⚠️ MediaPipe not installed - falling back to Haar cascades")
+    MEDIAPIPE_ENABLED = False
+
+# Drowsiness math lives in its own module so Numba compiles it once per process,
+# not on every Streamlit rerun of this script
+from ear_utils import eval_drowsy, update_closed_timer
+
+# Try to import streamlit-webrtc (browser-side capture over WebRTC)
+try:
+    import av
+    from streamlit_webrtc import webrtc_streamer, VideoProcessorBase
+    WEBRTC_ENABLED = True
+except ImportError:
+    WEBRTC_ENABLED = False
 
 # Add parent directory to path for Firebase import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -29,7 +51,10 @@ st.set_page_config(
 )
 
 # Custom CSS for better UI
-st.markdown("""
+@st.cache_resource
+def load_css():
+    """Build the page CSS once and reuse it on every rerun"""
+    return """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -70,23 +95,53 @@ st.markdown("""
         text-align: center;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # Title
 st.markdown('<div class="main-header">😴 SmartRail Shield - Pilot Drowsiness Detection</div>', unsafe_allow_html=True)
 
-# Load Haar Cascades
+# Use all cores and the optimized (SIMD) code paths in OpenCV
+cv2.setUseOptimized(True)
+cv2.setNumThreads(os.cpu_count() or 1)
+
+# Offload color conversion and cascade scanning to the GPU via OpenCL (T-API) when available
+USE_OPENCL = cv2.ocl.haveOpenCL()
+cv2.ocl.setUseOpenCL(USE_OPENCL)
+
+def opencv_has_avx2():
+    """True if AVX2 is in the OpenCV build's baseline or dispatched CPU features"""
+    for line in cv2.getBuildInformation().splitlines():
+        name, _, features = line.strip().partition(':')
+        if name in ('Baseline', 'Dispatched code generation') and 'AVX2' in features.split():
+            return True
+    return False
+
+# Haar Cascades (created per capture session: detectMultiScale keeps per-image
+# buffers inside the classifier, so concurrent sessions must not share one)
+def create_cascades():
+    """Create Haar Cascade classifiers from OpenCV's built-in data.
+    Returns (face_cascade, eye_cascade)"""
+    # Use OpenCV's built-in cascades (more reliable)
+    face_cascade = cv2.CascadeClassifier(
+        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+    )
+    eye_cascade = cv2.CascadeClassifier(
+        cv2.data.haarcascades + "haarcascade_eye.xml"
+    )
+    return face_cascade, eye_cascade
+
 @st.cache_resource
 def load_cascades():
-    """Load Haar Cascade classifiers from OpenCV's built-in data"""
+    """Check once at startup that the Haar Cascade classifiers load"""
+    # AVX2 only exists on x86; custom builds may leave it out - see README for a native build
+    is_x86 = platform.machine().lower() in ('x86_64', 'amd64', 'i386', 'i686')
+    if is_x86 and not opencv_has_avx2():
+        print("⚠️ OpenCV build has no AVX2 dispatch - cascade detection will be slower")
+    
     try:
-        # Use OpenCV's built-in cascades (more reliable)
-        face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        )
-        eye_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_eye.xml"
-        )
+        face_cascade, eye_cascade = create_cascades()
         
         # Verify they loaded correctly
         if face_cascade.empty():
@@ -95,21 +150,263 @@ def load_cascades():
         if eye_cascade.empty():
             st.error("❌ Failed to load eye cascade classifier")
             st.stop()
-            
-        return face_cascade, eye_cascade
         
     except Exception as e:
         st.error(f"❌ Error loading cascade classifiers: {str(e)}")
         st.stop()
 
-face_cascade, eye_cascade = load_cascades()
+load_cascades()
+
+# MediaPipe Face Mesh (not cached: the graph is not thread-safe and keeps per-stream tracking state)
+def create_detector():
+    """Create a Face Mesh for one capture session; returns None to use the Haar cascades"""
+    if not MEDIAPIPE_ENABLED:
+        return None
+    try:
+        return mp.solutions.face_mesh.FaceMesh(
+            max_num_faces=1,
+            refine_landmarks=True,
+            static_image_mode=False
+        )
+    except Exception as e:
+        print(f"⚠️ Failed to load MediaPipe Face Mesh: {str(e)}")
+        return None
+
+# Background Firebase writer
+@st.cache_resource
+def start_alert_worker():
+    """Start one daemon thread that pushes queued alerts to Firebase off the detection loop"""
+    alert_queue = queue.Queue()
+    
+    def worker():
+        while True:
+            alert_data = alert_queue.get()
+            try:
+                # Central PUSH
+                firebase_manager.push_to_realtime('drowsiness_alerts', alert_data)
+            except Exception as e:
+                print(f"⚠️ Firebase push failed: {str(e)}")
+    
+    threading.Thread(target=worker, daemon=True).start()
+    return alert_queue
+
+alert_queue = start_alert_worker() if FIREBASE_ENABLED and firebase_manager else None
 
 # Parameters
 EYE_CLOSED_TIME = 2.0  # seconds
+EAR_THRESHOLD = 0.22  # eye aspect ratio below this = eyes closed
+# Native capture backend per OS (DirectShow stalls before falling back elsewhere)
+CAMERA_BACKEND = {
+    'Windows': cv2.CAP_DSHOW,
+    'Linux': cv2.CAP_V4L2,
+    'Darwin': cv2.CAP_AVFOUNDATION
+}.get(platform.system(), cv2.CAP_ANY)
+CAPTURE_WIDTH, CAPTURE_HEIGHT, CAPTURE_FPS = 640, 480, 30  # requested camera mode
+DETECT_WIDTH = 320  # Haar cascades run on a frame downscaled to this width
+DETECT_EVERY = 3  # run detection every N frames, reuse the last result in between
+EYE_ROI_FRACTION = 0.55  # top fraction of the face box searched for eyes
+
+# Alarm sound (rendered once per alert, not every frame)
+ALARM_HTML = '<audio autoplay><source src="data:audio/wav;base64,UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUXrTp66hVFApGn+DyvmwhBSuBzvLZiTYIGGS57OihUBELTKXh8LJnHgU7k9n0yXkpBSh+zPLaizsKGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsL" type="audio/wav"></audio>'
+
+# Face Mesh landmark indices (p1..p6) for the eye aspect ratio
+LEFT_EYE = [33, 160, 158, 133, 153, 144]
+RIGHT_EYE = [362, 385, 387, 263, 373, 380]
+
+
+def grabber(cap, frame_queue, stop_event):
+    """Read frames in the background, keeping only the most recent one in the queue.
+    The grabber owns the camera and releases it on exit, so release never races a blocked read"""
+    try:
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                frame = None  # Signal a read failure to the detection loop
+            # Drop the stale frame so the consumer always gets the freshest one
+            try:
+                frame_queue.get_nowait()
+            except queue.Empty:
+                pass
+            frame_queue.put(frame)
+            if frame is None:
+                break
+    finally:
+        cap.release()
+
+
+# Reusable per-frame buffers, so OpenCV writes into the same memory every frame.
+# Thread-local: each session's detection loop / WebRTC worker gets its own set
+frame_buffers = threading.local()
+
+
+def get_buffer(name, shape):
+    """Return a reusable uint8 buffer, reallocating only when the frame size changes"""
+    buf = getattr(frame_buffers, name, None)
+    if buf is None or buf.shape != shape:
+        buf = np.empty(shape, dtype=np.uint8)
+        setattr(frame_buffers, name, buf)
+    return buf
+
+
+def detect_frame(frame, detector, cascades, closed_start, thresh, eye_sensitivity):
+    """Run face/eye detection on one BGR frame with this session's Face Mesh,
+    or its (face, eye) Haar cascades when detector is None.
+    Returns (detection, is_alert, new_closed_start); detection holds the drowsy
+    flag, eye count and the face/eye shapes to draw"""
+    drowsy = True  # assume eyes closed
+    eyes_detected = 0
+    face_boxes = []
+    eye_boxes = []
+    eye_contours = []
+    now = time.time()
+    
+    if detector is not None:
+        # Single Face Mesh pass - eye closure from landmarks (EAR)
+        res = detector.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=get_buffer('rgb', frame.shape)))
+        eye_points = np.empty((0, 2), dtype=np.float32)
+        if res.multi_face_landmarks:
+            fh, fw = frame.shape[:2]
+            landmarks = res.multi_face_landmarks[0].landmark
+            points = np.array([(lm.x * fw, lm.y * fh) for lm in landmarks], dtype=np.float32)
+            
+            x, y = points.min(axis=0).astype(int)
+            x2, y2 = points.max(axis=0).astype(int)
+            face_boxes.append((x, y, x2, y2))
+            eye_points = points[LEFT_EYE + RIGHT_EYE]
+        
+        drowsy, is_alert, closed_start = eval_drowsy(
+            eye_points, EAR_THRESHOLD, float(closed_start), now, float(thresh)
+        )
+        if not drowsy:
+            eyes_detected = 2
+            eye_contours = [eye_points[:6].astype(np.int32), eye_points[6:].astype(np.int32)]
+    else:
+        face_cascade, eye_cascade = cascades
+        
+        # Find faces on a downscaled copy; face boxes are scaled back to the full frame
+        scale = DETECT_WIDTH / frame.shape[1]
+        size = (DETECT_WIDTH, int(frame.shape[0] * scale))
+        if USE_OPENCL:
+            src = cv2.UMat(frame)
+            small = cv2.resize(src, size, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        else:
+            small = cv2.resize(
+                frame, size, dst=get_buffer('small', (size[1], size[0], 3)), interpolation=cv2.INTER_AREA
+            )
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=get_buffer('gray', (size[1], size[0])))
+        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        
+        for (x, y, w, h) in faces:
+            fx, fy = int(x / scale), int(y / scale)
+            fx2 = min(int((x + w) / scale), frame.shape[1])
+            fy2 = min(int((y + h) / scale), frame.shape[0])
+            face_boxes.append((fx, fy, fx2, fy2))
+            
+            # Eyes are too small for the cascade's 20x20 window at 320 px, so scan them
+            # at full resolution - only the upper band of the face, where the eyes sit
+            eye_y2 = fy + int((fy2 - fy) * EYE_ROI_FRACTION)
+            if USE_OPENCL:
+                roi_gray = cv2.cvtColor(cv2.UMat(src, (fy, eye_y2), (fx, fx2)), cv2.COLOR_BGR2GRAY)
+            else:
+                roi_gray = cv2.cvtColor(frame[fy:eye_y2, fx:fx2], cv2.COLOR_BGR2GRAY)
+            
+            # Single lenient pass instead of a strict pass plus a lenient retry
+            eyes = eye_cascade.detectMultiScale(
+                roi_gray,
+                scaleFactor=1.1,  # Better scale stepping
+                minNeighbors=max(1, eye_sensitivity - 1),
+                minSize=(12, 12),
+                maxSize=(80, 80)  # Limit max size
+            )
+            
+            eyes_detected = len(eyes)
+            
+            if eyes_detected > 0:
+                drowsy = False
+                for (ex, ey, ew, eh) in eyes:
+                    x1, y1 = fx + ex, fy + ey
+                    x2, y2 = x1 + ew, y1 + eh
+                    # Store corners so all eye boxes are drawn with one polylines call
+                    eye_boxes.append([(x1, y1), (x2, y1), (x2, y2), (x1, y2)])
+        
+        is_alert, closed_start = update_closed_timer(drowsy, closed_start, now, thresh)
+    
+    detection = {
+        'drowsy': drowsy,
+        'eyes_detected': eyes_detected,
+        'face_boxes': face_boxes,
+        'eye_boxes': eye_boxes,
+        'eye_contours': eye_contours
+    }
+    return detection, is_alert, closed_start
+
+
+def draw_detection(frame, detection, is_alert):
+    """Draw the latest face/eye shapes and the alert banner onto the frame"""
+    for (x1, y1, x2, y2) in detection['face_boxes']:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+    if detection['eye_boxes']:
+        cv2.polylines(frame, np.array(detection['eye_boxes'], np.int32), True, (0, 255, 0), 2)
+    if detection['eye_contours']:
+        cv2.polylines(frame, detection['eye_contours'], True, (0, 255, 0), 1)
+    
+    if is_alert:
+        cv2.putText(
+            frame,
+            "DROWSINESS ALERT!",
+            (50, 80),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1.2,
+            (0, 0, 255),
+            3
+        )
+
+
+if WEBRTC_ENABLED:
+    class DrowsyProcessor(VideoProcessorBase):
+        """Runs detection on browser frames inside the WebRTC callback thread"""
+        
+        def __init__(self):
+            self.sensitivity = 1.5
+            self.eye_sensitivity = 2
+            self.frame_count = 0
+            self.closed_start = -1.0
+            self.detection = None
+            self.is_alert = False
+            self.lock = threading.Lock()
+            self.detector = create_detector()
+            self.cascades = create_cascades() if self.detector is None else None
+        
+        def on_ended(self):
+            with self.lock:
+                if self.detector is not None:
+                    self.detector.close()
+                    self.detector = None
+        
+        def recv(self, frame):
+            img = frame.to_ndarray(format="bgr24")
+            
+            with self.lock:
+                if self.detection is None or self.frame_count % DETECT_EVERY == 0:
+                    self.detection, self.is_alert, self.closed_start = detect_frame(
+                        img, self.detector, self.cascades, self.closed_start,
+                        self.sensitivity, self.eye_sensitivity
+                    )
+                else:
+                    self.is_alert, self.closed_start = update_closed_timer(
+                        self.detection['drowsy'], self.closed_start, time.time(), self.sensitivity
+                    )
+                self.frame_count += 1
+                detection, is_alert = self.detection, self.is_alert
+            
+            draw_detection(img, detection, is_alert)
+            return av.VideoFrame.from_ndarray(img, format="bgr24")
+
 
 # Session state initialization
 if 'closed_start' not in st.session_state:
-    st.session_state.closed_start = None
+    st.session_state.closed_start = -1.0  # < 0 = eyes open
 if 'alarm_on' not in st.session_state:
     st.session_state.alarm_on = False
 if 'total_alerts' not in st.session_state:
@@ -123,17 +420,32 @@ if 'detection_running' not in st.session_state:
 st.sidebar.header("⚙️ Settings")
 sensitivity = st.sidebar.slider("Eye Closed Time Threshold (seconds)", 0.5, 5.0, 1.5, 0.5,
     help="Time before drowsiness alert - Lower = Faster alert, Higher = More delay")
-camera_index = st.sidebar.selectbox("Camera Source", [0, 1, 2], index=0)
+use_webrtc = WEBRTC_ENABLED and st.sidebar.radio(
+    "Capture Mode", ["Server Camera", "Browser (WebRTC)"], index=0,
+    help="Browser mode streams the webcam over WebRTC instead of re-sending every frame as an image"
+) == "Browser (WebRTC)"
+if not use_webrtc:
+    camera_index = st.sidebar.selectbox("Camera Source", [0, 1, 2], index=0)
 enable_sound = st.sidebar.checkbox("🔊 Enable Alarm Sound", value=True)
-eye_detection_sensitivity = st.sidebar.slider("Eye Detection Sensitivity", 1, 10, 2, 1,
-    help="Lower = more sensitive (faster detection), Higher = less sensitive (fewer false alarms)")
+# Only the Haar cascade fallback uses this; Face Mesh judges eye closure by EAR_THRESHOLD
+eye_detection_sensitivity = 2
+if not MEDIAPIPE_ENABLED:
+    eye_detection_sensitivity = st.sidebar.slider("Eye Detection Sensitivity", 1, 10, 2, 1,
+        help="Lower = more sensitive (faster detection), Higher = less sensitive (fewer false alarms)")
 
 # Main layout
 col1, col2 = st.columns([2, 1])
 
 with col1:
     st.subheader("📹 Live Camera Feed")
-    video_placeholder = st.empty()
+    if use_webrtc:
+        webrtc_ctx = webrtc_streamer(
+            key="drowsy",
+            video_processor_factory=DrowsyProcessor,
+            media_stream_constraints={"video": True, "audio": False}
+        )
+    else:
+        video_placeholder = st.empty()
 
 with col2:
     st.subheader("📊 Status")
@@ -146,17 +458,19 @@ with col2:
     with metrics_col2:
         eyes_status = st.empty()
 
-# Control buttons
-col_btn1, col_btn2, col_btn3 = st.columns(3)
-with col_btn1:
-    start_btn = st.button("▶️ Start Detection", type="primary", use_container_width=True, disabled=st.session_state.detection_running)
-with col_btn2:
-    stop_btn = st.button("⏹️ Stop Detection", use_container_width=True, disabled=not st.session_state.detection_running)
-with col_btn3:
-    if st.button("🔄 Reset Camera", use_container_width=True):
-        st.session_state.detection_running = False
-        time.sleep(0.5)
-        st.rerun()
+# Control buttons (server camera mode only)
+start_btn = stop_btn = False
+if not use_webrtc:
+    col_btn1, col_btn2, col_btn3 = st.columns(3)
+    with col_btn1:
+        start_btn = st.button("▶️ Start Detection", type="primary", use_container_width=True, disabled=st.session_state.detection_running)
+    with col_btn2:
+        stop_btn = st.button("⏹️ Stop Detection", use_container_width=True, disabled=not st.session_state.detection_running)
+    with col_btn3:
+        if st.button("🔄 Reset Camera", use_container_width=True):
+            st.session_state.detection_running = False
+            time.sleep(0.5)
+            st.rerun()
 
 if start_btn:
     st.session_state.detection_running = True
@@ -166,11 +480,71 @@ if stop_btn:
     st.session_state.detection_running = False
     st.rerun()
 
+
+def update_alert_state(detection, is_alert):
+    """Update the alarm/alert session state for this frame.
+    Returns (status text, status css class)"""
+    if is_alert:
+        if not st.session_state.alarm_on:
+            st.session_state.alarm_on = True
+            st.session_state.total_alerts += 1
+            st.session_state.play_alarm = True
+            
+            # Save to Firebase (pushed by the background alert worker)
+            if alert_queue is not None:
+                alert_queue.put({
+                    'module_name': 'Pilot Drowsiness',
+                    'alert': 'DROWSINESS_DETECTED',
+                    'eyes_detected': detection['eyes_detected'],
+                    'total_alerts': st.session_state.total_alerts
+                })
+        return "🚨 DROWSINESS ALERT!", "status-alert"
+    
+    if not detection['drowsy']:
+        st.session_state.alarm_on = False
+        st.session_state.play_alarm = False
+    return "👁️ Eyes Open - SAFE", "status-safe"
+
+
+def update_alarm(alarm_slot, alarm_playing):
+    """Play the alarm once when it turns on and clear it when the eyes reopen.
+    Returns the new alarm_playing flag"""
+    if st.session_state.play_alarm and enable_sound and not alarm_playing:
+        alarm_slot.markdown(ALARM_HTML, unsafe_allow_html=True)
+        return True
+    if not st.session_state.play_alarm and alarm_playing:
+        alarm_slot.empty()
+        return False
+    return alarm_playing
+
+
+def render_status(current_status, status_class, eyes_detected, rendered):
+    """Refresh the status box and statistics widgets, only re-sending the ones that changed.
+    rendered holds the values last sent to the browser"""
+    if rendered.get('status') != status_class:
+        status_placeholder.markdown(
+            f'<div class="alert-box {status_class}">{current_status}</div>',
+            unsafe_allow_html=True
+        )
+        rendered['status'] = status_class
+    if rendered.get('alerts') != st.session_state.total_alerts:
+        alert_count.metric("Total Alerts", st.session_state.total_alerts)
+        rendered['alerts'] = st.session_state.total_alerts
+    if rendered.get('eyes') != eyes_detected:
+        eyes_status.metric("Eyes Detected", eyes_detected)
+        rendered['eyes'] = eyes_detected
+
+
 # Main detection loop
-if st.session_state.detection_running:
+if st.session_state.detection_running and not use_webrtc:
     # Try to open camera with explicit release first
-    cap = cv2.VideoCapture(camera_index, cv2.CAP_DSHOW)
+    cap = cv2.VideoCapture(camera_index, CAMERA_BACKEND)
     cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer size
+    # Ask the driver for a compressed, modest-resolution stream instead of scaling down later
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_HEIGHT)
+    cap.set(cv2.CAP_PROP_FPS, CAPTURE_FPS)
     
     if not cap.isOpened():
         st.error("❌ Unable to open camera. Please check your camera connection or try a different camera source.")
@@ -186,116 +560,57 @@ if st.session_state.detection_running:
         # Create a stop button placeholder that updates during loop
         stop_container = st.empty()
         
+        # Alarm audio lives in its own slot so it is only sent on transitions
+        alarm_slot = st.empty()
+        alarm_playing = False
+        rendered = {}  # status widgets are only updated when their value changes
+        
+        # Camera capture runs in its own thread; the loop below consumes the latest frame
+        frame_queue = queue.Queue(maxsize=1)
+        stop_event = threading.Event()
+        grab_thread = threading.Thread(target=grabber, args=(cap, frame_queue, stop_event), daemon=True)
+        grab_thread.start()
+        
+        detector = create_detector()
+        cascades = create_cascades() if detector is None else None
+        
         try:
             while st.session_state.detection_running and frame_count < max_frames:
-                ret, frame = cap.read()
-                if not ret:
+                try:
+                    frame = frame_queue.get(timeout=0.5)
+                except queue.Empty:
+                    # The grabber thread exits on a failed or raising cap.read()
+                    if not grab_thread.is_alive():
+                        st.error("❌ Failed to read from camera")
+                        break
+                    continue
+                if frame is None:
                     st.error("❌ Failed to read from camera")
                     break
                 
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-                
-                drowsy = True  # assume eyes closed
-                eyes_detected = 0
-                
-                for (x, y, w, h) in faces:
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-                    roi_gray = gray[y:y + h, x:x + w]
-                    roi_color = frame[y:y + h, x:x + w]
-                    
-                    # Enhanced eye detection with multiple passes for better accuracy
-                    # First pass: Strict detection
-                    eyes = eye_cascade.detectMultiScale(
-                        roi_gray, 
-                        scaleFactor=1.1,  # Better scale stepping
-                        minNeighbors=eye_detection_sensitivity, 
-                        minSize=(15, 15),  # Slightly smaller for better detection
-                        maxSize=(80, 80)   # Limit max size
+                if frame_count % DETECT_EVERY == 0:
+                    detection, is_alert, st.session_state.closed_start = detect_frame(
+                        frame, detector, cascades, st.session_state.closed_start,
+                        sensitivity, eye_detection_sensitivity
                     )
-                    
-                    # If no eyes detected, try with more lenient parameters
-                    if len(eyes) == 0:
-                        eyes = eye_cascade.detectMultiScale(
-                            roi_gray, 
-                            scaleFactor=1.05, 
-                            minNeighbors=max(1, eye_detection_sensitivity - 1), 
-                            minSize=(12, 12)
-                        )
-                    
-                    eyes_detected = len(eyes)
-                    
-                    if eyes_detected > 0:
-                        drowsy = False
-                        for (ex, ey, ew, eh) in eyes:
-                            cv2.rectangle(
-                                roi_color, (ex, ey), (ex + ew, ey + eh), (0, 255, 0), 2
-                            )
-                
-                # Drowsiness Logic
-                current_status = "👁️ Eyes Open - SAFE"
-                status_class = "status-safe"
-                
-                if drowsy:
-                    if st.session_state.closed_start is None:
-                        st.session_state.closed_start = time.time()
-                    elif time.time() - st.session_state.closed_start > sensitivity:
-                        cv2.putText(
-                            frame,
-                            "DROWSINESS ALERT!",
-                            (50, 80),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            1.2,
-                            (0, 0, 255),
-                            3
-                        )
-                        current_status = "🚨 DROWSINESS ALERT!"
-                        status_class = "status-alert"
-                        
-                        if not st.session_state.alarm_on:
-                            st.session_state.alarm_on = True
-                            st.session_state.total_alerts += 1
-                            st.session_state.play_alarm = True
-                            
-                            # Save to Firebase
-                            if FIREBASE_ENABLED and firebase_manager:
-                                try:
-                                    alert_data = {
-                                        'module_name': 'Pilot Drowsiness',
-                                        'alert': 'DROWSINESS_DETECTED',
-                                        'eyes_detected': eyes_detected,
-                                        'total_alerts': st.session_state.total_alerts
-                                    }
-                                    # Central PUSH
-                                    firebase_manager.push_to_realtime('drowsiness_alerts', alert_data)
-                                except Exception as e:
-                                    print(f"⚠️ Firebase push failed: {str(e)}")
                 else:
-                    st.session_state.closed_start = None
-                    st.session_state.alarm_on = False
-                    st.session_state.play_alarm = False
+                    # Between detections, carry the last result forward but keep the timer ticking
+                    is_alert, st.session_state.closed_start = update_closed_timer(
+                        detection['drowsy'], st.session_state.closed_start, time.time(), sensitivity
+                    )
+                
+                draw_detection(frame, detection, is_alert)
                 
-                # Play alarm sound if enabled
-                if st.session_state.play_alarm and enable_sound:
-                    st.markdown("""
-                    <audio autoplay>
-                        <source src="data:audio/wav;base64,UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUXrTp66hVFApGn+DyvmwhBSuBzvLZiTYIGGS57OihUBELTKXh8LJnHgU7k9n0yXkpBSh+zPLaizsKGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsLGGe96+mjUxELTqfj8LJnHwU8lNr1yHcoBSh9y/HajDsL" type="audio/wav">
-                    </audio>
-                    """, unsafe_allow_html=True)
+                # Drowsiness Logic
+                current_status, status_class = update_alert_state(detection, is_alert)
+                alarm_playing = update_alarm(alarm_slot, alarm_playing)
                 
                 # Display frame
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=get_buffer('display', frame.shape))
                 video_placeholder.image(frame_rgb, channels="RGB", use_container_width=True)
                 
-                # Update status
-                status_placeholder.markdown(
-                    f'<div class="alert-box {status_class}">{current_status}</div>',
-                    unsafe_allow_html=True
-                )
-                
-                # Update metrics
-                alert_count.metric("Total Alerts", st.session_state.total_alerts)
-                eyes_status.metric("Eyes Detected", eyes_detected)
+                # Update status and metrics
+                render_status(current_status, status_class, detection['eyes_detected'], rendered)
                 
                 # Small delay to prevent overwhelming the UI
                 time.sleep(0.03)
@@ -303,10 +618,12 @@ if st.session_state.detection_running:
         except Exception as e:
             st.error(f"❌ Error during detection: {str(e)}")
         finally:
-            # Always release camera
-            if cap is not None and cap.isOpened():
-                cap.release()
-                cv2.destroyAllWindows()  # Cleanup any OpenCV windows
+            # Stop the capture thread; it releases the camera once its last read returns
+            stop_event.set()
+            grab_thread.join(timeout=1.0)
+            if detector is not None:
+                detector.close()
+            
             st.session_state.detection_running = False
             st.info("⏹️ Detection stopped - Camera released")
             
@@ -315,6 +632,29 @@ if st.session_state.detection_running:
                 time.sleep(0.5)
                 st.rerun()
 
+# Browser capture: detection runs in DrowsyProcessor, this loop only refreshes the UI
+if use_webrtc and webrtc_ctx.video_processor:
+    processor = webrtc_ctx.video_processor
+    processor.sensitivity = sensitivity
+    processor.eye_sensitivity = eye_detection_sensitivity
+    
+    alarm_slot = st.empty()
+    alarm_playing = False
+    rendered = {}
+    heartbeat = st.empty()
+    
+    while webrtc_ctx.state.playing:
+        with processor.lock:
+            detection, is_alert = processor.detection, processor.is_alert
+        if detection is not None:
+            current_status, status_class = update_alert_state(detection, is_alert)
+            alarm_playing = update_alarm(alarm_slot, alarm_playing)
+            render_status(current_status, status_class, detection['eyes_detected'], rendered)
+        # render_status skips unchanged widgets, but Streamlit only handles STOP/rerun
+        # requests when the script sends an update - so send one every pass
+        heartbeat.empty()
+        time.sleep(0.1)
+
 # Instructions
 with st.expander("ℹ️ How to Use"):
     st.markdown("""
@@ -325,6 +665,12 @@ with st.expander("ℹ️ How to Use"):
     4. **Adjust sensitivity** in the sidebar to change the alert threshold
     5. **Click "Stop Detection"** to end the session
     
+    ### Browser (WebRTC) Mode:
+    - Available when `streamlit-webrtc` is installed; select it under **Capture Mode** in the sidebar
+    - Click **START** on the video widget and allow camera access in the browser
+    - The browser's webcam is used, so the Camera Source setting is hidden
+    - Click **STOP** on the video widget to end the session
+    
     ### Features:
     - ✅ Real-time face and eye detection
     - ✅ Customizable drowsiness threshold
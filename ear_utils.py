@@ -0,0 +1,53 @@
+import numpy as np
+
+# Try to import Numba (JIT for the per-frame EAR / timer math)
+try:
+    from numba import njit
+except ImportError:
+    print("⚠️ Numba not installed - running drowsiness math in pure Python")
+    def njit(*args, **kwargs):
+        """No-op stand-in so the helpers still run without Numba"""
+        return lambda func: func
+
+
+# Explicit signatures compile the helpers when this module is first imported
+@njit("f8(f4[::1], f4[::1])", cache=True, fastmath=True)
+def point_distance(a, b):
+    """Euclidean distance between two 2D points"""
+    return np.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2)
+
+
+@njit("f8(f4[:, ::1])", cache=True, fastmath=True)
+def eye_aspect_ratio(points):
+    """EAR = (|p2-p6| + |p3-p5|) / (2 * |p1-p4|) for 6 eye landmarks"""
+    vertical = point_distance(points[1], points[5]) + point_distance(points[2], points[4])
+    horizontal = point_distance(points[0], points[3])
+    if horizontal == 0:
+        return 0.0
+    return vertical / (2.0 * horizontal)
+
+
+def update_closed_timer(drowsy, closed_start, now, thresh):
+    """Advance the eyes-closed timer; closed_start < 0 means eyes are open.
+    Returns (is_alert, new_closed_start)"""
+    if not drowsy:
+        return False, -1.0
+    if closed_start < 0:
+        return False, now
+    return now - closed_start > thresh, closed_start
+
+
+# Compiled copy for eval_drowsy; Python callers use the plain function (cheaper than JIT dispatch)
+update_closed_timer_jit = njit("Tuple((b1, f8))(b1, f8, f8, f8)", cache=True)(update_closed_timer)
+
+
+@njit("Tuple((b1, b1, f8))(f4[:, ::1], f8, f8, f8, f8)", cache=True, fastmath=True)
+def eval_drowsy(eye_points, ear_thresh, closed_start, now, thresh):
+    """Evaluate one frame from 12 eye landmarks (left then right; empty = no face).
+    Returns (drowsy, is_alert, new_closed_start)"""
+    drowsy = True
+    if eye_points.shape[0] == 12:
+        ear = (eye_aspect_ratio(eye_points[:6]) + eye_aspect_ratio(eye_points[6:])) / 2.0
+        drowsy = ear < ear_thresh
+    is_alert, new_closed_start = update_closed_timer_jit(drowsy, closed_start, now, thresh)
+    return drowsy, is_alert, new_closed_start